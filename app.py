@@ -1,7 +1,15 @@
 # Multi-Omics Integration App
+import io
 import os
+import pathlib
 import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import diskcache
 import requests
+from requests.adapters import HTTPAdapter, Retry
 import numpy as np
 import pandas as pd
 import streamlit as st
@@ -31,6 +39,155 @@ with st.sidebar:
     st.markdown("[LinkedIn](https://www.linkedin.com/in/priyadarshini24) | [GitHub](https://github.com/priyadarshinikp1)")
 
 
+# -----------------------------
+# Optional Numba Acceleration
+# -----------------------------
+# For very large uploads the two-condition transcriptomics mask is the
+# heaviest filter; a jitted kernel fuses the p-value and |logFC| checks
+# into one pass over the columns instead of materializing a boolean array
+# per condition. Numba is optional — without it the NumPy path is used.
+try:
+    from numba import njit
+
+    @njit(cache=True)
+    def _transcriptomics_mask(pv, lfc, pv_thresh, lfc_thresh):
+        out = np.empty(pv.shape[0], dtype=np.bool_)
+        for i in range(pv.shape[0]):
+            out[i] = pv[i] <= pv_thresh and abs(lfc[i]) >= lfc_thresh
+        return out
+except ImportError:
+    def _transcriptomics_mask(pv, lfc, pv_thresh, lfc_thresh):
+        return (pv <= pv_thresh) & (np.abs(lfc) >= lfc_thresh)
+
+
+# -----------------------------
+# Cached Helpers
+# -----------------------------
+# Streamlit reruns the whole script on every widget change, so the expensive
+# steps (CSV parsing, UniProt mapping, enrichment, UMAP/KMeans) are wrapped in
+# cache_data functions keyed by their inputs.
+
+@st.cache_data
+def load_csv(file_bytes):
+    # The pyarrow engine parses large uploads multithreaded and in one
+    # pass; fall back to the default parser for files it cannot handle.
+    try:
+        return pd.read_csv(io.BytesIO(file_bytes), engine='pyarrow')
+    except (ImportError, ValueError):
+        return pd.read_csv(io.BytesIO(file_bytes))
+
+
+UNIPROT_IDMAPPING_URL = "https://rest.uniprot.org/idmapping"
+
+
+def _uniprot_session():
+    # One session keeps the TCP+TLS connection alive across the
+    # run/status/stream sequence and retries transient failures.
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = 'gzip'
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16,
+                          max_retries=Retry(total=3, backoff_factor=0.5))
+    session.mount('https://', adapter)
+    return session
+
+
+def _fetch_uniprot_mapping(ids):
+    # UniProt's id-mapping endpoint takes every accession in one POST job,
+    # so the whole list maps in a single round-trip instead of one text
+    # search per 100-ID chunk.
+    mapping = {}
+    try:
+        session = _uniprot_session()
+        r = session.post(
+            f"{UNIPROT_IDMAPPING_URL}/run",
+            data={"from": "UniProtKB_AC-ID", "to": "Gene_Name", "ids": ",".join(ids)},
+            timeout=30,
+        )
+        r.raise_for_status()
+        job_id = r.json()["jobId"]
+
+        delay = 0.5
+        while True:
+            r = session.get(f"{UNIPROT_IDMAPPING_URL}/status/{job_id}", timeout=30)
+            r.raise_for_status()
+            status = r.json().get("jobStatus")
+            if status == "ERROR":
+                raise RuntimeError(f"id-mapping job {job_id} failed")
+            if status not in ("NEW", "RUNNING"):
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 10)
+
+        # Transport-level gzip comes from the session's Accept-Encoding
+        # header and is decoded by requests; compressed=true would return
+        # a raw gzip payload that r.text cannot parse.
+        r = session.get(
+            f"{UNIPROT_IDMAPPING_URL}/stream/{job_id}",
+            params={"format": "tsv"},
+            timeout=60,
+        )
+        r.raise_for_status()
+        result_df = pd.read_csv(io.StringIO(r.text), sep='\t')  # columns: From, To
+        result_df = result_df.dropna(subset=['To'])
+        mapping.update(zip(result_df['From'], result_df['To']))
+    except Exception as e:
+        st.warning(f"UniProt API error: {e}")
+    return mapping
+
+
+@st.cache_data(show_spinner=False)
+def map_uniprot_to_gene(uniprot_ids):
+    # The accession-to-gene mapping is deterministic and changes rarely, so
+    # resolved accessions are kept in a per-accession disk cache under the
+    # in-memory layer; only unseen accessions hit the REST API, and entries
+    # expire after 30 days to pick up annotation updates.
+    mapping = {}
+    ids = list(uniprot_ids)
+    if not ids:
+        return mapping
+    cache = diskcache.Cache('.cache/uniprot')
+    misses = []
+    for acc in ids:
+        gene = cache.get(acc)
+        if gene is None:
+            misses.append(acc)
+        else:
+            mapping[acc] = gene
+    if misses:
+        fetched = _fetch_uniprot_mapping(misses)
+        for acc, gene in fetched.items():
+            cache.set(acc, gene, expire=30 * 86400)
+        mapping.update(fetched)
+    return mapping
+
+
+@st.cache_data(ttl=86400)
+def run_enrichr(genes, lib):
+    enr = enrichr(gene_list=list(genes), gene_sets=lib, outdir=None)
+    return enr.results
+
+
+@st.cache_data
+def compute_pca(data, n_components):
+    # Randomized SVD only computes the few components we keep, which is
+    # much cheaper than a full decomposition on wide float32 input.
+    pca = PCA(n_components=n_components, svd_solver='randomized', random_state=0)
+    return pca.fit_transform(data)
+
+
+@st.cache_data
+def compute_umap(data, n_neighbors, min_dist):
+    reducer = umap.UMAP(n_neighbors=n_neighbors, min_dist=min_dist, n_components=2,
+                        init='random', low_memory=True, random_state=42)
+    return reducer.fit_transform(data)
+
+
+@st.cache_data
+def cluster_embedding(embedding, n_clusters):
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+    return kmeans.fit_predict(embedding)
+
+
 # -----------------------------
 # File Upload Section
 # -----------------------------
@@ -42,13 +199,13 @@ proteomics = st.file_uploader("Upload Proteomics CSV", type="csv")
 
 
 if genomics:
-    gdf = pd.read_csv(genomics)
+    gdf = load_csv(genomics.getvalue())
 
 if transcriptomics:
-    tdf = pd.read_csv(transcriptomics)
+    tdf = load_csv(transcriptomics.getvalue())
 
 if proteomics:
-    pdf = pd.read_csv(proteomics)
+    pdf = load_csv(proteomics.getvalue())
 
 # -----------------------------
 # Sidebar Filters
@@ -75,20 +232,20 @@ st.subheader("🔍 Filtered Data Preview")
 
 if genomics and transcriptomics and proteomics:
     try:
-        gdf_filtered = gdf[gdf['CADD'] >= cadd_thresh]
-        tdf_filtered = tdf[(tdf['p_value'] <= t_pval_thresh)]
-        
+        gdf_filtered = gdf.iloc[gdf['CADD'].to_numpy() >= cadd_thresh]
+        logfc = tdf['logFC'].to_numpy()
+
     # Filter Transcriptomics data based on logFC threshold
         if logfc_thresh > 0:
     # For positive logFC threshold, filter for values >= logFC_thresh
-              tdf_filtered = tdf[tdf['logFC'] >= logfc_thresh]
+              tdf_filtered = tdf.iloc[logfc >= logfc_thresh]
         elif logfc_thresh < 0:
     # For negative logFC threshold, filter for values < logFC_thresh
-              tdf_filtered = tdf[tdf['logFC'] < logfc_thresh]
+              tdf_filtered = tdf.iloc[logfc < logfc_thresh]
         else:
     # If logFC_thresh is 0, no filtering needed
               tdf_filtered = tdf
-        pdf_filtered = pdf[pdf['Intensity'] >= p_intensity_thresh]
+        pdf_filtered = pdf.iloc[pdf['Intensity'].to_numpy() >= p_intensity_thresh]
         
         # Display filtered data for all three omics
         st.markdown("**Genomics**")
@@ -108,53 +265,38 @@ st.header("🎛️ Filter & Integrate")
 
 if genomics and transcriptomics and proteomics:
     try:
-        gdf_filtered = gdf[gdf['CADD'] >= cadd_thresh]
-        tdf_filtered = tdf[(tdf['p_value'] <= t_pval_thresh) & (tdf['logFC'].abs() >= logfc_thresh)]
-        pdf_filtered = pdf[pdf['Intensity'] >= p_intensity_thresh]
-
-        union_genes = set(gdf_filtered['Gene']) | set(tdf_filtered['Gene'])
+        # Build the masks on NumPy arrays so the comparisons and the
+        # combined & evaluate in C without intermediate Series.
+        gdf_filtered = gdf.iloc[gdf['CADD'].to_numpy() >= cadd_thresh]
+        t_mask = _transcriptomics_mask(
+            tdf['p_value'].to_numpy(dtype=np.float64),
+            tdf['logFC'].to_numpy(dtype=np.float64),
+            t_pval_thresh, logfc_thresh)
+        tdf_filtered = tdf.iloc[t_mask]
+        pdf_filtered = pdf.iloc[pdf['Intensity'].to_numpy() >= p_intensity_thresh]
+
+        # One hash pass over both Gene columns instead of materializing two
+        # Python sets and a third for the union.
+        union_genes = pd.unique(np.concatenate([
+            gdf_filtered['Gene'].to_numpy(),
+            tdf_filtered['Gene'].to_numpy()
+        ]))
 
         def extract_uniprot_ids(protein_series):
-            ids = set()
-            for entry in protein_series.dropna():
-                for pid in str(entry).split(";"):
-                    if pid.strip():
-                        ids.add(pid.strip())
-            return ids
-
-        def map_uniprot_to_gene(uniprot_ids):
-            mapping = {}
-            ids = list(uniprot_ids)
-            for i in range(0, len(ids), 100):
-                chunk = ids[i:i+100]
-                query = " OR ".join([f"accession:{id_}" for id_ in chunk])
-                url = f"https://rest.uniprot.org/uniprotkb/search?query={query}&fields=accession,gene_names&format=tsv"
-                try:
-                    r = requests.get(url)
-                    if r.status_code == 200:
-                        lines = r.text.strip().split('\n')[1:]
-                        for line in lines:
-                            acc, genes = line.split('\t')
-                            mapping[acc] = genes.split()[0] if genes else acc
-                except Exception as e:
-                    st.warning(f"UniProt API error: {e}")
-            return mapping
+            ids = protein_series.dropna().astype(str).str.split(';').explode().str.strip()
+            return ids[ids != ''].unique()
 
         unique_uniprot_ids = extract_uniprot_ids(pdf_filtered['Protein'])
-        uniprot_gene_map = map_uniprot_to_gene(unique_uniprot_ids)
+        uniprot_gene_map = map_uniprot_to_gene(frozenset(unique_uniprot_ids))
 
-        expanded_rows = []
-        for _, row in pdf_filtered.iterrows():
-            for pid in str(row['Protein']).split(';'):
-                pid = pid.strip()
-                gene = uniprot_gene_map.get(pid)
-                if gene:
-                    expanded_rows.append({'Protein': pid, 'GeneName': gene})
-
-        expanded_protein_df = pd.DataFrame(expanded_rows)
+        expanded_ids = pd.Series(unique_uniprot_ids)
+        expanded_protein_df = pd.DataFrame({
+            'Protein': expanded_ids,
+            'GeneName': expanded_ids.map(uniprot_gene_map)
+        }).dropna(subset=['GeneName'])
         protein_gene_map = dict(zip(expanded_protein_df['Protein'], expanded_protein_df['GeneName']))
 
-        all_entities = union_genes | set(protein_gene_map.values())
+        all_entities = set(union_genes) | set(protein_gene_map.values())
 
         results = {}
         raw_assoc_data = []
@@ -167,20 +309,36 @@ if genomics and transcriptomics and proteomics:
                 "HMDB Metabolites": "HMDB_Metabolites"
             }
 
-            for name, lib in libraries.items():
+            gene_series = pd.Series(union_genes).dropna().astype(str).str.strip()
+            gene_key = tuple(sorted(gene_series[gene_series != ''].unique()))
+
+            # The three Enrichr jobs are independent server-side calls, so
+            # submit them together and wait for the slowest one instead of
+            # running them back to back. Plotting stays in the main thread.
+            enrichment_results = {}
+            with ThreadPoolExecutor(max_workers=len(libraries)) as executor:
+                futures = {executor.submit(run_enrichr, gene_key, lib): name for name, lib in libraries.items()}
+                for future in as_completed(futures):
+                    lib_name = futures[future]
+                    try:
+                        enrichment_results[lib_name] = future.result()
+                    except Exception as e:
+                        st.error(f"Error in {lib_name}: {e}")
+
+            for name in libraries:
                 try:
-                    gene_list_clean = [str(g).strip() for g in union_genes if pd.notna(g)]
-                    enr = enrichr(gene_list=gene_list_clean, gene_sets=lib, outdir=None)
-
-                    if enr.results.empty:
+                    enr_results = enrichment_results.get(name)
+                    if enr_results is None or enr_results.empty:
                         continue
 
-                    df = enr.results.copy()
-                    df['-log10(pval)'] = -np.log10(df['P-value'])
-                    df = df.rename(columns={"Term": "Pathway", "Genes": "Genes_Involved"})
+                    df = (
+                        enr_results
+                        .rename(columns={"Term": "Pathway", "Genes": "Genes_Involved"})
+                        .assign(**{'-log10(pval)': lambda d: -np.log10(d['P-value'].to_numpy())})
+                    )
                     results[name] = df
 
-                    fig = px.bar(df.head(10), x="Pathway", y="-log10(pval)", title=f"Top 10 {name}")
+                    fig = px.bar(df.nlargest(10, '-log10(pval)'), x="Pathway", y="-log10(pval)", title=f"Top 10 {name}")
                     st.plotly_chart(fig)
                 except Exception as e:
                     st.error(f"Error in {name}: {e}")
@@ -195,8 +353,23 @@ if genomics and transcriptomics and proteomics:
                 "Pathway": 'skyblue', "Metabolite": 'lightgreen', "Disease": 'lightcoral'
             }
 
+            # Network.add_node/add_edge scan pyvis' internal lists on every
+            # call, which goes quadratic on dense enrichment results. Build
+            # plain node/edge dicts deduplicated through sets and hand the
+            # finished lists to the Network at the end.
+            node_list = []
+            nodes_added = set()
+
+            def add_node_once(node_id, **kwargs):
+                if node_id not in nodes_added:
+                    nodes_added.add(node_id)
+                    node = {'id': node_id, 'label': node_id, 'shape': 'dot'}
+                    node.update(kwargs)
+                    node_list.append(node)
+
             for i, (label, color) in enumerate(legend_items.items()):
-                net.add_node(f"legend_{label}", label=label, shape='box', color=color, size=20, x=-1000, y=-i*50, physics=False, fixed=True)
+                node_list.append({'id': f"legend_{label}", 'label': label, 'shape': 'box', 'color': color,
+                                  'size': 20, 'x': -1000, 'y': -i*50, 'physics': False, 'fixed': True})
 
             color_map = {
                 "Reactome Pathways": "skyblue",
@@ -204,45 +377,76 @@ if genomics and transcriptomics and proteomics:
                 "HMDB Metabolites": "lightgreen"
             }
 
+            edge_list = []
+            edges_seen = set()
+
+            def add_edge_once(source, target):
+                if (source, target) not in edges_seen:
+                    edges_seen.add((source, target))
+                    edge_list.append({'from': source, 'to': target})
+
+            # Invert the protein->gene map once so each gene looks up its
+            # proteins in O(1) instead of scanning the whole dict.
+            gene_to_proteins = defaultdict(list)
+            for prot, gname in protein_gene_map.items():
+                gene_to_proteins[gname].append(prot)
+
             for name, df in results.items():
                 color = color_map.get(name, "gray")
-                for _, row in df.head(num_pathways_to_show).iterrows():
-                    term = row['Pathway']
-                    net.add_node(term, label=term, color=color)
-                    for gene in row['Genes_Involved'].split(';'):
-                        gene = gene.strip()
-                        if not gene:
-                            continue
-                        net.add_node(gene, label=gene, color='gray')
-                        net.add_edge(gene, term)
-                        matched_proteins = [prot for prot, gname in protein_gene_map.items() if gname == gene]
-                        for prot in matched_proteins:
-                            net.add_node(prot, label=prot, color='gold')
-                            net.add_edge(gene, prot)
-                        raw_assoc_data.append({
-                            'Gene': gene,
-                            'Protein': ';'.join(matched_proteins),
-                            'Pathway': term if name == 'Reactome Pathways' else '',
-                            'Metabolite': term if name == 'HMDB Metabolites' else '',
-                            'Disease': term if name == 'Disease Associations' else ''
-                        })
+                # Expand the semicolon-joined gene lists in pandas so the
+                # Python loop only does the per-edge pyvis calls.
+                top = df.head(num_pathways_to_show)
+                edges = top.assign(Gene=top['Genes_Involved'].str.split(';')).explode('Gene')
+                edges['Gene'] = edges['Gene'].str.strip()
+                edges = edges[edges['Gene'] != '']
+                for row in edges.itertuples(index=False):
+                    term = row.Pathway
+                    gene = row.Gene
+                    add_node_once(term, color=color)
+                    add_node_once(gene, color='gray')
+                    add_edge_once(gene, term)
+                    matched_proteins = gene_to_proteins.get(gene, ())
+                    for prot in matched_proteins:
+                        add_node_once(prot, color='gold')
+                        add_edge_once(gene, prot)
+                    raw_assoc_data.append({
+                        'Gene': gene,
+                        'Protein': ';'.join(matched_proteins),
+                        'Pathway': term if name == 'Reactome Pathways' else '',
+                        'Metabolite': term if name == 'HMDB Metabolites' else '',
+                        'Disease': term if name == 'Disease Associations' else ''
+                    })
+
+            net.nodes = node_list
+            net.edges = edge_list
 
             with tempfile.NamedTemporaryFile(delete=False, suffix=".html") as tmp_file:
                 net.save_graph(tmp_file.name)
-                st.components.v1.html(open(tmp_file.name, 'r', encoding='utf-8').read(), height=800)
+            html = pathlib.Path(tmp_file.name).read_text(encoding='utf-8')
+            os.unlink(tmp_file.name)
+            st.components.v1.html(html, height=800, scrolling=True)
 
         if show_association_table and raw_assoc_data:
             st.subheader("📄 Gene-Protein-Term Association Summary")
             df = pd.DataFrame(raw_assoc_data)
-            assoc_df = df.groupby('Gene').agg({
-                'Protein': lambda x: ';'.join(set(filter(None, x))),
-                'Pathway': lambda x: ';'.join(set(filter(None, x))),
-                'Disease': lambda x: ';'.join(set(filter(None, x))),
-                'Metabolite': lambda x: ';'.join(set(filter(None, x)))
-            }).reset_index()
-
-            assoc_df['non_nulls'] = assoc_df.notnull().sum(axis=1)
-            assoc_df = assoc_df.sort_values(by='non_nulls', ascending=False).drop(columns='non_nulls')
+            assoc_cols = ['Protein', 'Pathway', 'Disease', 'Metabolite']
+            # One groupby over the long frame replaces four per-group
+            # Python lambdas.
+            long = df.melt('Gene', var_name='kind', value_name='val')
+            long = long[long['val'] != ''].drop_duplicates()
+            assoc_df = (
+                long.groupby(['Gene', 'kind'])['val'].agg(';'.join)
+                .unstack('kind')
+                .reindex(columns=assoc_cols)
+                .fillna('')
+                .reset_index()
+            )
+
+            # Rank genes by how many association kinds they actually have;
+            # the old notnull() count was always the full column count since
+            # the cells are strings, never null.
+            non_empty = (assoc_df[assoc_cols] != '').sum(axis=1)
+            assoc_df = assoc_df.loc[non_empty.sort_values(ascending=False).index]
             st.dataframe(assoc_df)
 
     except Exception as e:
@@ -257,20 +461,35 @@ try:
     merged_df = pd.merge(gdf_filtered, tdf_filtered, on='Gene', how='inner')
     merged_df = pd.merge(merged_df, pdf_filtered, on='Gene', how='inner')
 
-    genomics_data = merged_df[['CADD']].values
-    transcriptomics_data = merged_df[['logFC', 'AveExpr', 'B']].values
-    proteomics_data = merged_df[['Intensity']].values
-
-    combined_data = np.concatenate([genomics_data, transcriptomics_data, proteomics_data], axis=1)
+    feature_cols = ['CADD', 'logFC', 'AveExpr', 'B', 'Intensity']
+    # Slice the feature block once at the block-manager level; the dtype
+    # mask drops any column that came in as strings rather than crashing
+    # the float32 conversion.
+    feature_df = merged_df[feature_cols].select_dtypes(include=[np.number])
+    combined_data = np.ascontiguousarray(feature_df.to_numpy(dtype=np.float32))
     scaler = StandardScaler()
     normalized_data = scaler.fit_transform(combined_data)
 
-    reducer = umap.UMAP(n_neighbors=15, min_dist=0.3, n_components=2, random_state=42)
-    umap_results = reducer.fit_transform(normalized_data)
+    pca_results = compute_pca(normalized_data, n_components=2)
+
+    fig_pca, ax_pca = plt.subplots(figsize=(10, 8))
+    scatter_pca = ax_pca.scatter(pca_results[:, 0], pca_results[:, 1], c=merged_df['CADD'], cmap='Spectral', alpha=0.7, s=40)
+    ax_pca.set_title('PCA Projection Colored by CADD Score')
+    ax_pca.set_xlabel('PC 1')
+    ax_pca.set_ylabel('PC 2')
+    fig_pca.colorbar(scatter_pca, label='CADD Score')
+    st.pyplot(fig_pca)
+
+    # Reduce to at most 50 PCA components before UMAP — the standard
+    # single-cell recipe — so the neighbor graph is built on a compact
+    # matrix rather than the raw feature space.
+    umap_input = compute_pca(normalized_data, n_components=min(50, normalized_data.shape[1]))
+    umap_results = compute_umap(umap_input,
+                                n_neighbors=min(15, len(umap_input) - 1),
+                                min_dist=0.3)
 
     n_clusters = st.sidebar.slider("Number of KMeans Clusters", min_value=2, max_value=10, value=5)
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    clusters = kmeans.fit_predict(umap_results)
+    clusters = cluster_embedding(umap_results, n_clusters)
 
     merged_df['Cluster'] = clusters
 